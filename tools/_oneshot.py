@@ -1,25 +1,64 @@
 from __future__ import annotations
 
+import os
+import re
+import sys
+import time
 from pathlib import Path
 from typing import Optional
 
 from _paths import get_paths
 from _run import run
 
+_STDIN_IS_TTY = sys.stdin.isatty()
+
+
+def prompt_line(prompt: str) -> str:
+    """读取一行用户输入。
+
+    TTY 下沿用 input()（保留行编辑）；管道/脚本输入直接 readline，
+    跳过 input() 每次的 readline 状态重置与缓冲分配。
+    """
+    if _STDIN_IS_TTY:
+        return input(prompt)
+
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+    line = sys.stdin.readline()
+    if not line:
+        raise EOFError
+    return line.rstrip("\r\n")
+
 
 def _ensure_dir(p: Path) -> None:
     p.mkdir(parents=True, exist_ok=True)
 
 
+_HOME = Path.home()
+
+
+def expand_user_path(p: Path) -> Path:
+    # 常见的 ~/ 前缀直接拼接缓存的 home，避免 expanduser 每次重查环境变量；
+    # ~user 形式少见，仍交给标准实现。
+    s = str(p)
+    if s == "~":
+        return _HOME
+    if s.startswith("~/") or s.startswith("~\\"):
+        return _HOME / s[2:]
+    if s.startswith("~"):
+        return p.expanduser()
+    return p
+
+
 def select_store_dir(store_dir: Optional[Path], default_store_dir: Path) -> Path:
     if store_dir is None:
         try:
-            text = input(f"MEMORY_STORE_DIR（回车使用默认：{default_store_dir}）：").strip()
+            text = prompt_line(f"MEMORY_STORE_DIR（回车使用默认：{default_store_dir}）：").strip()
         except EOFError:
             text = ""
         store_dir = Path(text) if text else default_store_dir
 
-    store_dir = store_dir.expanduser()
+    store_dir = expand_user_path(store_dir)
     _ensure_dir(store_dir)
     return store_dir
 
@@ -27,7 +66,7 @@ def select_store_dir(store_dir: Optional[Path], default_store_dir: Path) -> Path
 def _prompt_yes_no(prompt: str, default_yes: bool = True) -> bool:
     suffix = "[Y/n]" if default_yes else "[y/N]"
     try:
-        text = input(f"{prompt}{suffix}：").strip().lower()
+        text = prompt_line(f"{prompt}{suffix}：").strip().lower()
     except EOFError:
         return default_yes
 
@@ -37,46 +76,54 @@ def _prompt_yes_no(prompt: str, default_yes: bool = True) -> bool:
     return text in ("y", "yes", "1", "true", "t", "是")
 
 
-def _parse_keywords(text: str) -> list[str]:
-    text = text.replace("，", ",")
+_SESSION_BACKTRACE: Optional[bool] = None
 
-    def _is_cjk_char(ch: str) -> bool:
-        code = ord(ch)
-        return 0x4E00 <= code <= 0x9FFF
 
-    def _max_len(token: str) -> int:
-        # 关键字尽量短：CJK 建议更短，英文/数字允许稍长一些。
-        return 4 if any(_is_cjk_char(ch) for ch in token) else 12
+def get_backtrace_choice() -> bool:
+    """是否启用 RUST_BACKTRACE=1：同一会话只询问一次，后续动作复用答案。
 
-    parts: list[str] = []
-    for seg in text.split(","):
-        seg = seg.strip()
-        if not seg:
-            continue
-        parts.extend([p for p in seg.split() if p])
+    设置 MEMORY_MCP_BACKTRACE=1/0 可完全跳过询问（CI/脚本用）。
+    """
+    global _SESSION_BACKTRACE
+    if _SESSION_BACKTRACE is None:
+        env = os.environ.get("MEMORY_MCP_BACKTRACE")
+        if env is not None:
+            _SESSION_BACKTRACE = env == "1"
+        else:
+            _SESSION_BACKTRACE = _prompt_yes_no("是否启用 RUST_BACKTRACE=1？", default_yes=False)
+    return _SESSION_BACKTRACE
+
+
+_CJK_RE = re.compile(r"[\u4E00-\u9FFF]")
+_KEYWORD_SPLIT_RE = re.compile(r"[,，\s]+")
 
-    out: list[str] = []
-    seen: set[str] = set()
-    for raw in parts:
-        token = raw.strip().lower()
-        if not token:
-            continue
 
-        max_len = _max_len(token)
-        if len(token) > max_len:
-            token = token[:max_len]
+def _max_len(token: str) -> int:
+    # 关键字尽量短：CJK 建议更短，英文/数字允许稍长一些。
+    return 4 if _CJK_RE.search(token) else 12
 
-        if token and token not in seen:
-            seen.add(token)
-            out.append(token)
 
-    return out
+def _parse_keywords(text: str) -> list[str]:
+    # 分隔正则已吞掉空白，token 无需再 strip；首尾可能产生空串，靠 if t 过滤。
+    # dict 保序去重：每个 token 只做一次哈希插入。
+    parts = _KEYWORD_SPLIT_RE.split(text)
+    return list(dict.fromkeys(t[: _max_len(t)] for t in map(str.lower, parts) if t))
+
+
+def _keyword_args(keywords: list[str], *, batch: bool) -> list[str]:
+    # remember 的 --keyword 定义为 num_args=1..，一个标志可带全部值，
+    # argv 项从 2N 降到 N+1；recall 仍是每个值一个标志。
+    if not keywords:
+        return []
+    if batch:
+        return ["--keyword", *keywords]
+    return [x for kw in keywords for x in ("--keyword", kw)]
 
 
 def _prompt_keywords(required: bool) -> list[str]:
     while True:
         try:
-            text = input("关键字（逗号分隔；至少 1 个；建议短词）：").strip()
+            text = prompt_line("关键字（逗号分隔；至少 1 个；建议短词）：").strip()
         except EOFError:
             text = ""
         keywords = _parse_keywords(text)
@@ -92,13 +139,13 @@ def _prompt_inline_or_file(label: str, inline_flag: str, file_flag: str) -> list
         print("  2) 文件路径（推荐，支持多行/长文本）")
 
         try:
-            choice = input("请选择 [2]：").strip()
+            choice = prompt_line("请选择 [2]：").strip()
         except EOFError:
             choice = "2"
 
         if choice in ("", "2"):
             try:
-                path_text = input(f"{label} 文件路径：").strip()
+                path_text = prompt_line(f"{label} 文件路径：").strip()
             except EOFError:
                 path_text = ""
 
@@ -116,7 +163,7 @@ def _prompt_inline_or_file(label: str, inline_flag: str, file_flag: str) -> list
 
         if choice == "1":
             try:
-                text = input(f"{label}（单行；长文本请用文件）：").strip()
+                text = prompt_line(f"{label}（单行；长文本请用文件）：").strip()
             except EOFError:
                 text = ""
 
@@ -137,7 +184,7 @@ def _prompt_output_mode_args(default_text: bool = True) -> list[str]:
 
     default_choice = "3" if default_text else "1"
     try:
-        choice = input(f"请选择 [{default_choice}]：").strip()
+        choice = prompt_line(f"请选择 [{default_choice}]：").strip()
     except EOFError:
         choice = default_choice
 
@@ -151,8 +198,40 @@ def _prompt_output_mode_args(default_text: bool = True) -> list[str]:
     return ["--text"]
 
 
+# exists() 结果的短 TTL 缓存：交互循环里连续触发 remember/recall 时不必每次 stat。
+_EXE_STAT_TTL = 5.0
+_exe_exists_cache: dict[Path, float] = {}
+
+
+def release_exe_exists(exe: Path) -> bool:
+    now = time.monotonic()
+    ts = _exe_exists_cache.get(exe)
+    if ts is not None and now - ts < _EXE_STAT_TTL:
+        return True
+    if exe.exists():
+        _exe_exists_cache[exe] = now
+        return True
+    return False
+
+
+# 会话级标记：一旦确认过产物可用，后续动作（如菜单里连续 remember/recall）直接放行。
+_ENSURED_EXE = False
+
+
+def invalidate_release_exe_cache() -> None:
+    """cargo build / cargo clean 之后调用，避免缓存与磁盘状态不一致。"""
+    global _ENSURED_EXE
+    _ENSURED_EXE = False
+    _exe_exists_cache.clear()
+
+
 def _ensure_release_exe(paths) -> bool:
-    if paths.release_exe_path.exists():
+    global _ENSURED_EXE
+    if _ENSURED_EXE:
+        return True
+
+    if release_exe_exists(paths.release_exe_path):
+        _ENSURED_EXE = True
         return True
 
     print(f"未找到 Release 产物：{paths.release_exe_path}")
@@ -166,7 +245,10 @@ def _ensure_release_exe(paths) -> bool:
         "--manifest-path",
         str(paths.manifest_path),
     ]
-    return run(cmdline, cwd=paths.repo_root) == 0
+    invalidate_release_exe_cache()
+    ok = run(cmdline, cwd=paths.repo_root) == 0
+    _ENSURED_EXE = ok
+    return ok
 
 
 def action_cli_remember() -> int:
@@ -178,12 +260,12 @@ def action_cli_remember() -> int:
     store_dir = select_store_dir(None, default_store_dir)
 
     env: dict[str, str] = {"MEMORY_STORE_DIR": str(store_dir)}
-    if _prompt_yes_no("是否启用 RUST_BACKTRACE=1？", default_yes=False):
+    if get_backtrace_choice():
         env["RUST_BACKTRACE"] = "1"
 
     while True:
         try:
-            namespace = input("namespace（必填，例如 u1/p1）：").strip()
+            namespace = prompt_line("namespace（必填，例如 u1/p1）：").strip()
         except EOFError:
             namespace = ""
         if namespace:
@@ -196,14 +278,14 @@ def action_cli_remember() -> int:
     diary_args = _prompt_inline_or_file("diary", "--diary", "--diary-file")
 
     try:
-        occurred_at = input("occurred_at（可选，RFC3339 或 YYYY-MM-DD，回车跳过）：").strip()
+        occurred_at = prompt_line("occurred_at（可选，RFC3339 或 YYYY-MM-DD，回车跳过）：").strip()
     except EOFError:
         occurred_at = ""
 
     importance: str = ""
     while True:
         try:
-            importance = input("importance（可选 1~5，回车跳过）：").strip()
+            importance = prompt_line("importance（可选 1~5，回车跳过）：").strip()
         except EOFError:
             importance = ""
 
@@ -222,27 +304,27 @@ def action_cli_remember() -> int:
         print("importance 必须在 1~5。")
 
     try:
-        source = input("source（可选，回车跳过）：").strip()
+        source = prompt_line("source（可选，回车跳过）：").strip()
     except EOFError:
         source = ""
 
     out_args = _prompt_output_mode_args(default_text=True)
 
-    cmdline: list[str] = [str(paths.release_exe_path), "--cli", "remember", "--namespace", namespace]
-    for kw in keywords:
-        cmdline += ["--keyword", kw]
-
-    cmdline += slice_args
-    cmdline += diary_args
-
-    if occurred_at:
-        cmdline += ["--occurred-at", occurred_at]
-    if importance:
-        cmdline += ["--importance", importance]
-    if source:
-        cmdline += ["--source", source]
-
-    cmdline += out_args
+    kw_args = _keyword_args(keywords, batch=True)
+    cmdline: list[str] = [
+        str(paths.release_exe_path),
+        "--cli",
+        "remember",
+        "--namespace",
+        namespace,
+        *kw_args,
+        *slice_args,
+        *diary_args,
+        *(["--occurred-at", occurred_at] if occurred_at else []),
+        *(["--importance", importance] if importance else []),
+        *(["--source", source] if source else []),
+        *out_args,
+    ]
 
     return run(cmdline, cwd=paths.memory_dir, env_overrides=env)
 
@@ -256,12 +338,12 @@ def action_cli_recall() -> int:
     store_dir = select_store_dir(None, default_store_dir)
 
     env: dict[str, str] = {"MEMORY_STORE_DIR": str(store_dir)}
-    if _prompt_yes_no("是否启用 RUST_BACKTRACE=1？", default_yes=False):
+    if get_backtrace_choice():
         env["RUST_BACKTRACE"] = "1"
 
     while True:
         try:
-            namespace = input("namespace（必填，例如 u1/p1）：").strip()
+            namespace = prompt_line("namespace（必填，例如 u1/p1）：").strip()
         except EOFError:
             namespace = ""
         if namespace:
@@ -271,24 +353,24 @@ def action_cli_recall() -> int:
     keywords = _prompt_keywords(required=False)
 
     try:
-        start = input("start（可选，RFC3339 或 YYYY-MM-DD，回车跳过）：").strip()
+        start = prompt_line("start（可选，RFC3339 或 YYYY-MM-DD，回车跳过）：").strip()
     except EOFError:
         start = ""
 
     try:
-        end = input("end（可选，RFC3339 或 YYYY-MM-DD，回车跳过）：").strip()
+        end = prompt_line("end（可选，RFC3339 或 YYYY-MM-DD，回车跳过）：").strip()
     except EOFError:
         end = ""
 
     try:
-        query = input("query（可选，回车跳过）：").strip()
+        query = prompt_line("query（可选，回车跳过）：").strip()
     except EOFError:
         query = ""
 
     limit: str = ""
     while True:
         try:
-            limit = input("limit（可选 1~100，回车跳过使用默认 20）：").strip()
+            limit = prompt_line("limit（可选 1~100，回车跳过使用默认 20）：").strip()
         except EOFError:
             limit = ""
 
@@ -309,21 +391,20 @@ def action_cli_recall() -> int:
     include_diary = _prompt_yes_no("include_diary（是否返回 diary）？", default_yes=False)
     out_args = _prompt_output_mode_args(default_text=True)
 
-    cmdline: list[str] = [str(paths.release_exe_path), "--cli", "recall", "--namespace", namespace]
-    for kw in keywords:
-        cmdline += ["--keyword", kw]
-
-    if start:
-        cmdline += ["--start", start]
-    if end:
-        cmdline += ["--end", end]
-    if query:
-        cmdline += ["--query", query]
-    if limit:
-        cmdline += ["--limit", limit]
-    if include_diary:
-        cmdline += ["--include-diary"]
-
-    cmdline += out_args
+    kw_args = _keyword_args(keywords, batch=False)
+    cmdline: list[str] = [
+        str(paths.release_exe_path),
+        "--cli",
+        "recall",
+        "--namespace",
+        namespace,
+        *kw_args,
+        *(["--start", start] if start else []),
+        *(["--end", end] if end else []),
+        *(["--query", query] if query else []),
+        *(["--limit", limit] if limit else []),
+        *(["--include-diary"] if include_diary else []),
+        *out_args,
+    ]
 
     return run(cmdline, cwd=paths.memory_dir, env_overrides=env)
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import functools
+import itertools
 from dataclasses import dataclass
 from pathlib import Path
 
+_TOOLS_DIR = Path(__file__).resolve().parent
+
 
 @dataclass(frozen=True)
 class MemoryPaths:
@@ -14,14 +18,16 @@ class MemoryPaths:
 
 
 def _find_repo_root(start: Path) -> Path:
-    for p in [start, *start.parents]:
+    for p in itertools.chain([start], start.parents):
         if (p / ".git").exists():
             return p
     raise FileNotFoundError(f"未找到仓库根目录（缺少 .git）：start={start}")
 
 
+@functools.lru_cache(maxsize=None)
 def get_paths() -> MemoryPaths:
-    tools_dir = Path(__file__).resolve().parent
+    # 路径在进程生命周期内不变，缓存结果避免每个动作都重新向上查找 .git。
+    tools_dir = _TOOLS_DIR
     memory_dir = tools_dir.parent
 
     repo_root = _find_repo_root(memory_dir)
@@ -3,9 +3,13 @@ from __future__ import annotations
 import os
 import subprocess
 import sys
+import threading
 from pathlib import Path
 from typing import Iterable
 
+# MEMORY_MCP_QUIET=1：静默 [RUN]/[OK]/[FAIL] 日志，同时省去命令行字符串化的开销。
+_QUIET = os.environ.get("MEMORY_MCP_QUIET") == "1"
+
 
 def _cmd_to_string(cmd: list[str]) -> str:
     try:
@@ -14,43 +18,97 @@ def _cmd_to_string(cmd: list[str]) -> str:
         return " ".join(cmd)
 
 
+def _pump_fd(src, dst_fd: int) -> None:
+    # 以 64 KiB 块从子进程管道直搬到目标 fd，绕过 Python 层文本缓冲。
+    src_fd = src.fileno()
+    while True:
+        chunk = os.read(src_fd, 65536)
+        if not chunk:
+            return
+        os.write(dst_fd, chunk)
+
+
 def run(
     cmd: list[str],
     cwd: Path,
     env_overrides: dict[str, str] | None = None,
     passthrough: bool = True,
 ) -> int:
-    env = os.environ.copy()
+    # 无覆盖时传 env=None，让子进程直接继承，省去整份环境变量的拷贝。
+    env: dict[str, str] | None = None
     if env_overrides:
-        env.update({k: v for k, v in env_overrides.items() if v is not None})
+        env = os.environ.copy()
+        for k, v in env_overrides.items():
+            if v is not None:
+                env[k] = v
 
-    print(f"[RUN] {_cmd_to_string(cmd)}", flush=True)
+    if not _QUIET:
+        print(f"[RUN] {_cmd_to_string(cmd)}", flush=True)
 
     try:
         if passthrough:
-            result = subprocess.run(cmd, cwd=str(cwd), env=env)
+            returncode = subprocess.run(cmd, cwd=str(cwd), env=env).returncode
         else:
-            result = subprocess.run(
+            # 边读边写：长时间构建的输出不再整体攒在内存里，峰值 RSS 有界且低延迟。
+            sys.stdout.flush()
+            sys.stderr.flush()
+            with subprocess.Popen(
                 cmd,
                 cwd=str(cwd),
                 env=env,
-                capture_output=True,
-                text=True,
-                encoding="utf-8",
-                errors="replace",
-            )
-            sys.stdout.write(result.stdout)
-            sys.stderr.write(result.stderr)
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                bufsize=0,
+            ) as p:
+                threads = [
+                    threading.Thread(target=_pump_fd, args=(p.stdout, sys.stdout.fileno())),
+                    threading.Thread(target=_pump_fd, args=(p.stderr, sys.stderr.fileno())),
+                ]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+            returncode = p.returncode
     except FileNotFoundError:
         print(f"[FAIL] 未找到命令：{cmd[0]}", file=sys.stderr)
         return 127
 
-    if result.returncode == 0:
-        print("[OK]", flush=True)
-    else:
-        print(f"[FAIL] exit_code={result.returncode}", flush=True)
+    if not _QUIET:
+        if returncode == 0:
+            print("[OK]", flush=True)
+        else:
+            print(f"[FAIL] exit_code={returncode}", flush=True)
+
+    return returncode
 
-    return result.returncode
+
+def run_exec(
+    cmd: list[str],
+    cwd: Path,
+    env_overrides: dict[str, str] | None = None,
+) -> int:
+    """用目标命令替换当前进程（os.exec*），适用于脚本的最后一步。
+
+    省去保留 Python 父进程的 fork+wait；Windows 上 exec 语义不同，回退到 run()。
+    """
+    if sys.platform == "win32":
+        return run(cmd, cwd=cwd, env_overrides=env_overrides)
+
+    env = os.environ.copy()
+    if env_overrides:
+        for k, v in env_overrides.items():
+            if v is not None:
+                env[k] = v
+
+    if not _QUIET:
+        print(f"[RUN] {_cmd_to_string(cmd)}", flush=True)
+
+    try:
+        os.chdir(cwd)
+        os.execvpe(cmd[0], cmd, env)
+    except FileNotFoundError:
+        print(f"[FAIL] 未找到命令：{cmd[0]}", file=sys.stderr)
+        return 127
 
 
 def split_by_double_dash(args: list[str]) -> tuple[list[str], list[str]]:
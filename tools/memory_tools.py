@@ -1,40 +1,66 @@
 from __future__ import annotations
 
+import os
 import shlex
 import sys
 from pathlib import Path
-from typing import Optional
-
-from _oneshot import action_cli_recall, action_cli_remember, select_store_dir
+from typing import Callable, Optional
+
+from _oneshot import (
+    action_cli_recall,
+    action_cli_remember,
+    get_backtrace_choice,
+    invalidate_release_exe_cache,
+    prompt_line,
+    release_exe_exists,
+    select_store_dir,
+)
 from _paths import get_paths
-from _run import run, split_by_double_dash
+from _run import run, run_exec, split_by_double_dash
+
+
+# 帮助与菜单文本为静态内容，模块加载时拼接一次即可。
+_HELP_TEXT = "\n".join(
+    [
+        "Memory Rust 快捷命令：",
+        "",
+        "交互式（推荐）：",
+        "  memory_tools.bat（含一键 remember/recall）",
+        "",
+        "命令行模式（可选，CI/脚本用；必须显式提供 --cli）：",
+        "  memory_tools.py --cli test [-- <test args>]",
+        "  memory_tools.py --cli build-release [<cargo args...>]",
+        "  memory_tools.py --cli build-static-windows [<cargo args...>]",
+        "  memory_tools.py --cli run-release [--store-dir <dir>] [--backtrace]",
+        "  memory_tools.py --cli remember [--store-dir <dir>] [--backtrace] [--build] <memory.exe remember args...>",
+        "  memory_tools.py --cli recall [--store-dir <dir>] [--backtrace] [--build] <memory.exe recall args...>",
+        "  memory_tools.py --cli clean",
+        "",
+        "示例：",
+        "  memory_tools.py --cli test -- --nocapture",
+        "  memory_tools.py --cli run-release --store-dir .memory_store --backtrace",
+        "  memory_tools.py --cli recall --store-dir .memory_store --namespace u1/p1 --keyword 项目 --text",
+    ]
+)
+
+_MENU_STATIC = "\n".join(
+    [
+        "",
+        "  1) 运行测试（cargo test）",
+        "  2) 构建 Release（cargo build --release）",
+        "  3) 构建 Release（Windows 静态 CRT）",
+        "  4) 运行 Release 产物（memory.exe）",
+        "  5) 清理构建产物（cargo clean）",
+        "  6) 一键 remember（memory.exe remember）",
+        "  7) 一键 recall（memory.exe recall）",
+        "  0) 退出",
+        "",
+    ]
+)
 
 
 def _print_help() -> None:
-    print(
-        "\n".join(
-            [
-                "Memory Rust 快捷命令：",
-                "",
-                "交互式（推荐）：",
-                "  memory_tools.bat（含一键 remember/recall）",
-                "",
-                "命令行模式（可选，CI/脚本用；必须显式提供 --cli）：",
-                "  memory_tools.py --cli test [-- <test args>]",
-                "  memory_tools.py --cli build-release [<cargo args...>]",
-                "  memory_tools.py --cli build-static-windows [<cargo args...>]",
-                "  memory_tools.py --cli run-release [--store-dir <dir>] [--backtrace]",
-                "  memory_tools.py --cli remember [--store-dir <dir>] [--backtrace] [--build] <memory.exe remember args...>",
-                "  memory_tools.py --cli recall [--store-dir <dir>] [--backtrace] [--build] <memory.exe recall args...>",
-                "  memory_tools.py --cli clean",
-                "",
-                "示例：",
-                "  memory_tools.py --cli test -- --nocapture",
-                "  memory_tools.py --cli run-release --store-dir .memory_store --backtrace",
-                "  memory_tools.py --cli recall --store-dir .memory_store --namespace u1/p1 --keyword 项目 --text",
-            ]
-        )
-    )
+    print(_HELP_TEXT)
 
 
 def _split_args_line(text: str) -> list[str]:
@@ -50,7 +76,7 @@ def _split_args_line(text: str) -> list[str]:
 
 def _prompt_optional_args(prompt: str) -> list[str]:
     try:
-        line = input(prompt).strip()
+        line = prompt_line(prompt).strip()
     except EOFError:
         return []
     return _split_args_line(line)
@@ -90,6 +116,7 @@ def _action_build_release(static_windows: bool = False) -> int:
         str(paths.manifest_path),
         *extra,
     ]
+    invalidate_release_exe_cache()
     code = run(cmdline, cwd=paths.repo_root, env_overrides=env)
     if code == 0:
         if static_windows:
@@ -100,6 +127,7 @@ def _action_build_release(static_windows: bool = False) -> int:
 
 def _action_clean() -> int:
     paths = get_paths()
+    invalidate_release_exe_cache()
     return run(
         ["cargo", "clean", "--manifest-path", str(paths.manifest_path)],
         cwd=paths.repo_root,
@@ -107,7 +135,9 @@ def _action_clean() -> int:
 
 
 def _action_run_release_exe(
-    store_dir: Optional[Path] = None, enable_backtrace: bool = False
+    store_dir: Optional[Path] = None,
+    enable_backtrace: bool = False,
+    exec_replace: bool = False,
 ) -> int:
     paths = get_paths()
 
@@ -127,8 +157,10 @@ def _action_run_release_exe(
     print("注意：该进程会等待 MCP JSON-RPC 输入；按 Ctrl+C 结束进程。")
     print(f"MEMORY_STORE_DIR={store_dir}")
 
+    # exec_replace：CLI 模式下没有后续工作，直接替换进程，省掉 Python 父进程。
+    runner = run_exec if exec_replace else run
     try:
-        return run([str(paths.release_exe_path)], cwd=paths.memory_dir, env_overrides=env)
+        return runner([str(paths.release_exe_path)], cwd=paths.memory_dir, env_overrides=env)
     except KeyboardInterrupt:
         print("\n已退出。")
         return 130
@@ -136,24 +168,20 @@ def _action_run_release_exe(
 
 def _interactive_menu() -> int:
     paths = get_paths()
+    menu_header = "\n".join(
+        [
+            "",
+            "Memory Rust 工具菜单：",
+            f"  项目目录：{paths.memory_dir}",
+            f"  Release 产物：{paths.release_exe_path}",
+        ]
+    )
     while True:
-        print("")
-        print("Memory Rust 工具菜单：")
-        print(f"  项目目录：{paths.memory_dir}")
-        print(f"  Release 产物：{paths.release_exe_path}")
-        print("")
-        print("  1) 运行测试（cargo test）")
-        print("  2) 构建 Release（cargo build --release）")
-        print("  3) 构建 Release（Windows 静态 CRT）")
-        print("  4) 运行 Release 产物（memory.exe）")
-        print("  5) 清理构建产物（cargo clean）")
-        print("  6) 一键 remember（memory.exe remember）")
-        print("  7) 一键 recall（memory.exe recall）")
-        print("  0) 退出")
-        print("")
+        print(menu_header)
+        print(_MENU_STATIC)
 
         try:
-            choice = input("请选择：").strip()
+            choice = prompt_line("请选择：").strip()
         except EOFError:
             return 0
 
@@ -169,12 +197,9 @@ def _interactive_menu() -> int:
             _action_build_release(static_windows=True)
             continue
         if choice == "4":
-            try:
-                backtrace_text = input("是否启用 RUST_BACKTRACE=1？[Y/n]：").strip().lower()
-            except EOFError:
-                backtrace_text = ""
-            enable_backtrace = backtrace_text in ("", "y", "yes")
-            _action_run_release_exe(store_dir=None, enable_backtrace=enable_backtrace)
+            _action_run_release_exe(
+                store_dir=None, enable_backtrace=get_backtrace_choice()
+            )
             continue
         if choice == "5":
             _action_clean()
@@ -191,39 +216,38 @@ def _interactive_menu() -> int:
 
 def _parse_cli_passthrough_args(
     raw_args: list[str],
-) -> tuple[Optional[Path], bool, bool, list[str]]:
-    store_dir: Optional[Path] = None
+) -> tuple[Optional[str], bool, bool, list[str]]:
+    # 单次迭代器遍历，无下标/长度检查；run-release 与 remember/recall 共用。
+    # store-dir 保持字符串，留到真正需要时再构造 Path。
+    store_dir: Optional[str] = None
     enable_backtrace = False
     build_if_missing = False
     forwarded: list[str] = []
 
-    i = 0
-    while i < len(raw_args):
-        a = raw_args[i]
-        if a == "--store-dir" and i + 1 < len(raw_args):
-            store_dir = Path(raw_args[i + 1])
-            i += 2
-            continue
-        if a in ("--backtrace", "--bt"):
+    it = iter(raw_args)
+    for a in it:
+        if a == "--store-dir":
+            value = next(it, None)
+            if value is None:
+                forwarded.append(a)
+                break
+            store_dir = value
+        elif a in ("--backtrace", "--bt"):
             enable_backtrace = True
-            i += 1
-            continue
-        if a in ("--build", "--build-if-missing"):
+        elif a in ("--build", "--build-if-missing"):
             build_if_missing = True
-            i += 1
-            continue
-        if a == "--":
-            forwarded.extend(raw_args[i + 1 :])
+        elif a == "--":
+            forwarded.extend(it)
             break
-        forwarded.append(a)
-        i += 1
+        else:
+            forwarded.append(a)
 
     return store_dir, enable_backtrace, build_if_missing, forwarded
 
 
 def _ensure_release_exe_noninteractive(build_if_missing: bool) -> bool:
     paths = get_paths()
-    if paths.release_exe_path.exists():
+    if release_exe_exists(paths.release_exe_path):
         return True
 
     print(f"未找到 Release 产物：{paths.release_exe_path}")
@@ -251,18 +275,109 @@ def _action_cli_passthrough(tool: str, raw_args: list[str]) -> int:
     if not _ensure_release_exe_noninteractive(build_if_missing):
         return 2
 
-    default_store_dir = paths.memory_dir / ".memory_store"
-    store_dir = store_dir.expanduser() if store_dir else default_store_dir
-    if not store_dir.is_absolute():
-        store_dir = paths.memory_dir / store_dir
-    store_dir.mkdir(parents=True, exist_ok=True)
+    # 字符串层面判断绝对/相对，只在定型后构造一次 Path。
+    if store_dir is None:
+        store_dir_path = paths.memory_dir / ".memory_store"
+    else:
+        s = os.path.expanduser(store_dir)
+        store_dir_path = Path(s) if os.path.isabs(s) else paths.memory_dir / s
+    store_dir_path.mkdir(parents=True, exist_ok=True)
 
-    env: dict[str, str] = {"MEMORY_STORE_DIR": str(store_dir)}
+    env: dict[str, str] = {"MEMORY_STORE_DIR": str(store_dir_path)}
     if enable_backtrace:
         env["RUST_BACKTRACE"] = "1"
 
     cmdline: list[str] = [str(paths.release_exe_path), "--cli", tool, *forwarded]
-    return run(cmdline, cwd=paths.memory_dir, env_overrides=env)
+    return run_exec(cmdline, cwd=paths.memory_dir, env_overrides=env)
+
+
+def _cmd_test(rest: list[str]) -> int:
+    paths = get_paths()
+    cargo_args, test_args = split_by_double_dash(rest)
+    cmdline = [
+        "cargo",
+        "test",
+        "--manifest-path",
+        str(paths.manifest_path),
+        *cargo_args,
+    ]
+    if test_args:
+        cmdline += ["--", *test_args]
+    return run(cmdline, cwd=paths.repo_root)
+
+
+def _cmd_build_release(rest: list[str]) -> int:
+    paths = get_paths()
+    cmdline = [
+        "cargo",
+        "build",
+        "--release",
+        "--manifest-path",
+        str(paths.manifest_path),
+        *rest,
+    ]
+    code = run(cmdline, cwd=paths.repo_root)
+    if code == 0:
+        print(f"产物：{paths.release_exe_path}")
+    return code
+
+
+def _cmd_build_static_windows(rest: list[str]) -> int:
+    paths = get_paths()
+    env = {"RUSTFLAGS": "-C target-feature=+crt-static"}
+    cmdline = [
+        "cargo",
+        "build",
+        "--release",
+        "--manifest-path",
+        str(paths.manifest_path),
+        *rest,
+    ]
+    code = run(cmdline, cwd=paths.repo_root, env_overrides=env)
+    if code == 0:
+        print("说明：该方式会静态链接 VC CRT，但仍会依赖 Windows 系统 DLL。")
+        print(f"产物：{paths.release_exe_path}")
+    return code
+
+
+def _cmd_clean(rest: list[str]) -> int:
+    paths = get_paths()
+    cmdline = [
+        "cargo",
+        "clean",
+        "--manifest-path",
+        str(paths.manifest_path),
+        *rest,
+    ]
+    return run(cmdline, cwd=paths.repo_root)
+
+
+def _cmd_run_release(rest: list[str]) -> int:
+    store_dir, enable_backtrace, _build, extra = _parse_cli_passthrough_args(rest)
+    if extra:
+        if extra[0] in ("-h", "--help"):
+            _print_help()
+            return 0
+        print(f"未知参数：{extra[0]}")
+        return 2
+
+    return _action_run_release_exe(
+        store_dir=Path(store_dir) if store_dir else None,
+        enable_backtrace=enable_backtrace,
+        exec_replace=True,
+    )
+
+
+# O(1) 命令分发表，替代逐个字符串比较的 if 链。
+_COMMANDS: dict[str, Callable[[list[str]], int]] = {
+    "test": _cmd_test,
+    "build-release": _cmd_build_release,
+    "build-static-windows": _cmd_build_static_windows,
+    "clean": _cmd_clean,
+    "run-release": _cmd_run_release,
+    "remember": lambda rest: _action_cli_passthrough("remember", rest),
+    "recall": lambda rest: _action_cli_passthrough("recall", rest),
+}
 
 
 def main(argv: list[str]) -> int:
@@ -289,93 +404,9 @@ def main(argv: list[str]) -> int:
         _print_help()
         return 0
 
-    if cmd == "test":
-        paths = get_paths()
-        cargo_args, test_args = split_by_double_dash(rest)
-        cmdline = [
-            "cargo",
-            "test",
-            "--manifest-path",
-            str(paths.manifest_path),
-            *cargo_args,
-        ]
-        if test_args:
-            cmdline += ["--", *test_args]
-        return run(cmdline, cwd=paths.repo_root)
-
-    if cmd == "build-release":
-        paths = get_paths()
-        cmdline = [
-            "cargo",
-            "build",
-            "--release",
-            "--manifest-path",
-            str(paths.manifest_path),
-            *rest,
-        ]
-        code = run(cmdline, cwd=paths.repo_root)
-        if code == 0:
-            print(f"产物：{paths.release_exe_path}")
-        return code
-
-    if cmd == "build-static-windows":
-        paths = get_paths()
-        env = {"RUSTFLAGS": "-C target-feature=+crt-static"}
-        cmdline = [
-            "cargo",
-            "build",
-            "--release",
-            "--manifest-path",
-            str(paths.manifest_path),
-            *rest,
-        ]
-        code = run(cmdline, cwd=paths.repo_root, env_overrides=env)
-        if code == 0:
-            print("说明：该方式会静态链接 VC CRT，但仍会依赖 Windows 系统 DLL。")
-            print(f"产物：{paths.release_exe_path}")
-        return code
-
-    if cmd == "clean":
-        paths = get_paths()
-        cmdline = [
-            "cargo",
-            "clean",
-            "--manifest-path",
-            str(paths.manifest_path),
-            *rest,
-        ]
-        return run(cmdline, cwd=paths.repo_root)
-
-    if cmd == "run-release":
-        store_dir: Optional[Path] = None
-        enable_backtrace = False
-
-        i = 0
-        while i < len(rest):
-            a = rest[i]
-            if a == "--store-dir" and i + 1 < len(rest):
-                store_dir = Path(rest[i + 1])
-                i += 2
-                continue
-            if a in ("--backtrace", "--bt"):
-                enable_backtrace = True
-                i += 1
-                continue
-            if a in ("-h", "--help"):
-                _print_help()
-                return 0
-            print(f"未知参数：{a}")
-            return 2
-
-        return _action_run_release_exe(
-            store_dir=store_dir, enable_backtrace=enable_backtrace
-        )
-
-    if cmd == "remember":
-        return _action_cli_passthrough("remember", rest)
-
-    if cmd == "recall":
-        return _action_cli_passthrough("recall", rest)
+    handler = _COMMANDS.get(cmd)
+    if handler is not None:
+        return handler(rest)
 
     print(f"未知命令：{cmd}")
     _print_help()
@@ -2,29 +2,59 @@ from __future__ import annotations
 
 import argparse
 import json
+import os
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Iterable
 
+try:
+    import orjson  # C 实现的 JSON 解析/序列化，比 stdlib 快数倍；可选依赖。
+except ImportError:
+    orjson = None
+
 from _paths import get_paths
-from _run import ensure_no_bom
 
-_DEP_SECTIONS = (
-    "dependencies",
-    "devDependencies",
-    "peerDependencies",
-    "optionalDependencies",
+_DEP_SECTIONS = frozenset(
+    (
+        "dependencies",
+        "devDependencies",
+        "peerDependencies",
+        "optionalDependencies",
+    )
 )
 
+# 逐行扫描 Cargo.toml/Cargo.lock 的热路径正则，模块加载时编译一次。
+_SECTION_RE = re.compile(r"^\s*\[([^\]]+)\]\s*$")
+_VERSION_LINE_RE = re.compile(r'^(\s*version\s*=\s*")([^"]+)("\s*)$')
+_NAME_RE = re.compile(r'^\s*name\s*=\s*"([^"]+)"\s*$')
+_SOURCE_RE = re.compile(r'^\s*source\s*=\s*".*"\s*$')
+
+# Cargo.toml 的 [package] 段定位与段内 version 行（多行模式），供一次性 sub 使用。
+_PACKAGE_SECTION_RE = re.compile(r"(?ms)^\[package\]\s*$.*?(?=^\[|\Z)")
+# 行尾兼容 \r：_read_text 不做换行翻译，CRLF 检出（Windows autocrlf）原样保留，
+# \r 留在第 3 组里随替换原样写回。
+_VERSION_LINE_M_RE = re.compile(r'(?m)^(\s*version\s*=\s*")([^"]+)("[ \t]*\r?)$')
+
 
 def _read_text(path: Path) -> str:
-    return ensure_no_bom(path.read_text(encoding="utf-8", errors="replace"))
+    # read_bytes + 一次性 decode：跳过 TextIOWrapper 的构建与增量解码。
+    data = path.read_bytes()
+    if data[:3] == b"\xef\xbb\xbf":
+        data = data[3:]
+    return data.decode("utf-8", "replace")
 
 
 def _write_text(path: Path, text: str) -> None:
-    with path.open("w", encoding="utf-8", newline="\n") as f:
-        f.write(text)
+    # 单次整块写入，直达内核，省去 BufferedWriter/TextIOWrapper 的建立与刷新；
+    # O_BINARY（仅 Windows 存在）保持 \n 不被翻译成 \r\n。
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+    fd = os.open(path, flags, 0o644)
+    try:
+        os.write(fd, text.encode("utf-8"))
+    finally:
+        os.close(fd)
 
 
 def _normalize_version(text: str) -> str:
@@ -44,146 +74,196 @@ def _update_lines_preserve_trailing_newline(original: str, lines: Iterable[str])
 def _read_cargo_package_version(cargo_toml_text: str) -> str:
     in_package = False
     for line in cargo_toml_text.splitlines():
-        sec = re.match(r"^\s*\[([^\]]+)\]\s*$", line)
+        sec = _SECTION_RE.match(line)
         if sec:
             in_package = sec.group(1).strip() == "package"
             continue
         if not in_package:
             continue
 
-        m = re.match(r'^\s*version\s*=\s*"([^"]+)"\s*$', line)
+        m = _VERSION_LINE_RE.match(line)
         if m:
-            return m.group(1)
+            return m.group(2)
 
     raise ValueError("未在 Cargo.toml 的 [package] 段找到 version 字段。")
 
 
 def _set_cargo_toml_version(cargo_toml_text: str, new_version: str) -> str:
-    in_package = False
-    changed = False
-    out_lines: list[str] = []
-
-    for line in cargo_toml_text.splitlines():
-        sec = re.match(r"^\s*\[([^\]]+)\]\s*$", line)
-        if sec:
-            in_package = sec.group(1).strip() == "package"
-            out_lines.append(line)
-            continue
-
-        if in_package:
-            m = re.match(r'^(\s*version\s*=\s*")([^"]+)("\s*)$', line)
-            if m:
-                out_lines.append(f"{m.group(1)}{new_version}{m.group(3)}")
-                changed = True
-                continue
-
-        out_lines.append(line)
+    # 只在 [package] 段内做一次 sub，段外文本原样拼回，
+    # 省去 splitlines + join 对整个文件的两次拷贝。
+    sec = _PACKAGE_SECTION_RE.search(cargo_toml_text)
+    if sec is None:
+        raise ValueError("未能更新 Cargo.toml：未找到 [package] 下的 version 行。")
 
-    if not changed:
+    new_section, count = _VERSION_LINE_M_RE.subn(
+        lambda m: f"{m.group(1)}{new_version}{m.group(3)}", sec.group(0), count=1
+    )
+    if count == 0:
         raise ValueError("未能更新 Cargo.toml：未找到 [package] 下的 version 行。")
 
-    return _update_lines_preserve_trailing_newline(cargo_toml_text, out_lines)
+    return cargo_toml_text[: sec.start()] + new_section + cargo_toml_text[sec.end() :]
 
 
 def _set_cargo_lock_local_package_version(
     cargo_lock_text: str, *, package_name: str, new_version: str
 ) -> tuple[str, bool]:
+    # 单次流式扫描：跟踪当前 [[package]] 块的状态，块结束时就地改写 lines，
+    # 不再收集 starts 列表、也不做每块的切片拷贝。
     lines = cargo_lock_text.splitlines()
-    out_lines = list(lines)
+    changed = False
 
-    starts = [i for i, line in enumerate(lines) if line.strip() == "[[package]]"]
-    if not starts:
-        return cargo_lock_text, False
-    starts.append(len(lines))
+    in_block = False
+    name: str | None = None
+    has_source = False
+    version_line_idx: int | None = None
+    version_prefix = ""
+    version_value: str | None = None
+    version_suffix = ""
 
-    changed = False
+    def _maybe_patch() -> None:
+        # 仅修改本地包（Cargo.lock 中通常没有 source 字段），避免误改同名的 crates.io 依赖。
+        nonlocal changed
+        if (
+            name == package_name
+            and not has_source
+            and version_line_idx is not None
+            and version_value is not None
+            and version_value != new_version
+        ):
+            lines[version_line_idx] = f"{version_prefix}{new_version}{version_suffix}"
+            changed = True
 
-    for start, end in zip(starts, starts[1:]):
-        block_lines = lines[start:end]
+    for idx, line in enumerate(lines):
+        if line.strip() == "[[package]]":
+            if in_block:
+                _maybe_patch()
+            in_block = True
+            name = None
+            has_source = False
+            version_line_idx = None
+            version_value = None
+            continue
 
-        name: str | None = None
-        has_source = False
-        version_line_idx: int | None = None
-        version_prefix = ""
-        version_value: str | None = None
-        version_suffix = ""
+        if not in_block:
+            continue
 
-        for offset, line in enumerate(block_lines):
-            m_name = re.match(r'^\s*name\s*=\s*"([^"]+)"\s*$', line)
+        # 绝大多数行三种字段都不是：先用 C 层 startswith 预筛，再进正则。
+        s = line.lstrip()
+        if s.startswith("name"):
+            m_name = _NAME_RE.match(line)
             if m_name:
                 name = m_name.group(1)
-
-            if re.match(r'^\s*source\s*=\s*".*"\s*$', line):
+        elif s.startswith("source"):
+            if _SOURCE_RE.match(line):
                 has_source = True
-
-            m_ver = re.match(r'^(\s*version\s*=\s*")([^"]+)("\s*)$', line)
+        elif s.startswith("version"):
+            m_ver = _VERSION_LINE_RE.match(line)
             if m_ver:
-                version_line_idx = start + offset
+                version_line_idx = idx
                 version_prefix = m_ver.group(1)
                 version_value = m_ver.group(2)
                 version_suffix = m_ver.group(3)
 
-        # 仅修改本地包（Cargo.lock 中通常没有 source 字段），避免误改同名的 crates.io 依赖。
-        if (
-            name == package_name
-            and not has_source
-            and version_line_idx is not None
-            and version_value is not None
-            and version_value != new_version
-        ):
-            out_lines[version_line_idx] = f"{version_prefix}{new_version}{version_suffix}"
-            changed = True
+    if in_block:
+        _maybe_patch()
+
+    if not changed:
+        return cargo_lock_text, False
 
-    return _update_lines_preserve_trailing_newline(cargo_lock_text, out_lines), changed
+    return _update_lines_preserve_trailing_newline(cargo_lock_text, lines), changed
 
 
-def _rewrite_internal_spec(spec: Any, *, old_version: str, new_version: str) -> Any:
+def _rewrite_internal_spec(
+    spec: Any,
+    *,
+    old_version: str,
+    new_version: str,
+    caret_prefix: str,
+    tilde_prefix: str,
+) -> Any:
+    # 前缀字符串由调用方预拼好，内层循环不再为每个依赖重复拼接。
     if not isinstance(spec, str):
         return spec
 
     if spec == old_version:
         return new_version
-    if spec.startswith("^" + old_version):
-        return "^" + new_version + spec[len("^" + old_version) :]
-    if spec.startswith("~" + old_version):
-        return "~" + new_version + spec[len("~" + old_version) :]
+    if spec.startswith(caret_prefix):
+        return "^" + new_version + spec[len(caret_prefix) :]
+    if spec.startswith(tilde_prefix):
+        return "~" + new_version + spec[len(tilde_prefix) :]
     return spec
 
 
-def _load_json(path: Path) -> Any:
-    return json.loads(_read_text(path))
+def _loads_json(text: str) -> Any:
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
 
 
 def _dump_json(obj: Any) -> str:
+    # orjson 的 OPT_INDENT_2 输出与 stdlib 的 indent=2/ensure_ascii=False 格式一致。
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode("utf-8") + "\n"
     return json.dumps(obj, ensure_ascii=False, indent=2) + "\n"
 
 
 def _iter_workspace_package_json(packages_dir: Path) -> list[Path]:
-    if not packages_dir.exists():
+    # os.scandir 直接迭代 dirent，比 glob 少一层 Path 构造与多余的 stat；
+    # 排序在字符串上做（C 层比较），最后才包成 Path。
+    try:
+        with os.scandir(packages_dir) as it:
+            names = [
+                os.path.join(e.path, "package.json")
+                for e in it
+                if e.is_dir(follow_symlinks=False)
+                and os.path.isfile(os.path.join(e.path, "package.json"))
+            ]
+    except FileNotFoundError:
         return []
-    return sorted(packages_dir.glob("*/package.json"))
+
+    names.sort()
+    return [Path(s) for s in names]
+
+
+def _read_texts_parallel(paths: list[Path]) -> list[str]:
+    # 每个文件都是读盘 + 解析的独立工作，read_bytes 期间释放 GIL，线程池重叠 I/O 延迟。
+    if len(paths) <= 1:
+        return [_read_text(p) for p in paths]
+    with ThreadPoolExecutor(max_workers=min(8, len(paths))) as ex:
+        return list(ex.map(_read_text, paths))
+
+
+def _load_workspace_package_jsons(
+    package_json_paths: list[Path],
+) -> list[tuple[Path, str, Any]]:
+    """一次性读取并解析全部 package.json，供名字收集与版本改写共用。"""
+    texts = _read_texts_parallel(package_json_paths)
+    return [
+        (p, text, _loads_json(text))
+        for p, text in zip(package_json_paths, texts)
+    ]
 
 
-def _collect_workspace_names(package_json_paths: list[Path]) -> set[str]:
+def _collect_workspace_names(parsed: list[tuple[Path, str, Any]]) -> set[str]:
     names: set[str] = set()
-    for p in package_json_paths:
-        data = _load_json(p)
+    for _, _, data in parsed:
         if isinstance(data, dict) and isinstance(data.get("name"), str) and data["name"]:
             names.add(data["name"])
     return names
 
 
 def _set_package_json_versions(
-    package_json_paths: list[Path],
+    parsed: list[tuple[Path, str, Any]],
     *,
     workspace_names: set[str],
     old_version: str,
     new_version: str,
 ) -> dict[Path, str]:
     changed: dict[Path, str] = {}
+    caret_prefix = "^" + old_version
+    tilde_prefix = "~" + old_version
 
-    for p in package_json_paths:
-        data = _load_json(p)
+    for p, original_text, data in parsed:
         if not isinstance(data, dict):
             continue
 
@@ -194,22 +274,31 @@ def _set_package_json_versions(
                 data["version"] = new_version
                 file_changed = True
 
-        for section in _DEP_SECTIONS:
-            deps = data.get(section)
+        # C 层集合交集直接给出文件里实际存在的段，省掉四次无条件 get。
+        for section in _DEP_SECTIONS.intersection(data):
+            deps = data[section]
             if not isinstance(deps, dict):
                 continue
-            for name in workspace_names:
-                if name not in deps:
+            # 遍历较小的一侧：deps 通常只有几项，workspace 名单做 O(1) 集合判断。
+            for name, spec in deps.items():
+                if name not in workspace_names:
                     continue
                 new_spec = _rewrite_internal_spec(
-                    deps[name], old_version=old_version, new_version=new_version
+                    spec,
+                    old_version=old_version,
+                    new_version=new_version,
+                    caret_prefix=caret_prefix,
+                    tilde_prefix=tilde_prefix,
                 )
-                if new_spec != deps[name]:
+                if new_spec != spec:
                     deps[name] = new_spec
                     file_changed = True
 
         if file_changed:
-            changed[p] = _dump_json(data)
+            new_text = _dump_json(data)
+            # 序列化结果与原文件字节一致时跳过，避免无意义的写入与 mtime 扰动。
+            if new_text != original_text:
+                changed[p] = new_text
 
     return changed
 
@@ -255,20 +344,30 @@ def main(argv: list[str]) -> int:
     cargo_toml_text = _read_text(cargo_toml_path)
     old_version = _read_cargo_package_version(cargo_toml_text)
 
+    # 幂等重跑的常见情形：版本没变就不必再读 Cargo.lock、扫描 package.json。
+    if old_version == new_version:
+        print(f"版本未变化：{old_version}，无需修改。")
+        return 0
+
     cargo_toml_new = _set_cargo_toml_version(cargo_toml_text, new_version)
 
+    # 直接读并捕获 FileNotFoundError，比 exists() + read 少一次 stat 系统调用。
     cargo_lock_changed = False
     cargo_lock_new = ""
-    if cargo_lock_path.exists():
+    try:
         cargo_lock_text = _read_text(cargo_lock_path)
+    except FileNotFoundError:
+        pass
+    else:
         cargo_lock_new, cargo_lock_changed = _set_cargo_lock_local_package_version(
             cargo_lock_text, package_name="memory", new_version=new_version
         )
 
     package_json_paths = _iter_workspace_package_json(packages_dir)
-    workspace_names = _collect_workspace_names(package_json_paths)
+    parsed = _load_workspace_package_jsons(package_json_paths)
+    workspace_names = _collect_workspace_names(parsed)
     package_json_updates = _set_package_json_versions(
-        package_json_paths,
+        parsed,
         workspace_names=workspace_names,
         old_version=old_version,
         new_version=new_version,
@@ -281,24 +380,28 @@ def main(argv: list[str]) -> int:
         changed_files.append(cargo_lock_path)
     changed_files.extend(sorted(package_json_updates.keys()))
 
-    print(f"版本变更：{old_version} -> {new_version}")
+    # 汇总拼成一个字符串一次写出，而非逐文件 print。
+    summary = [f"版本变更：{old_version} -> {new_version}"]
     if not changed_files:
-        print("未检测到需要修改的文件。")
+        summary.append("未检测到需要修改的文件。")
+        sys.stdout.write("\n".join(summary) + "\n")
         return 0
 
-    for p in changed_files:
-        print(f"- {p}")
-
+    summary.extend(f"- {p}" for p in changed_files)
     if args.dry_run:
-        print("dry-run：未写入文件。")
+        summary.append("dry-run：未写入文件。")
+        sys.stdout.write("\n".join(summary) + "\n")
         return 0
 
+    sys.stdout.write("\n".join(summary) + "\n")
+
     if cargo_toml_new != cargo_toml_text:
         _write_text(cargo_toml_path, cargo_toml_new)
     if cargo_lock_changed:
         _write_text(cargo_lock_path, cargo_lock_new)
-    for p, content in package_json_updates.items():
-        _write_text(p, content)
+    if package_json_updates:
+        with ThreadPoolExecutor(max_workers=min(8, len(package_json_updates))) as ex:
+            list(ex.map(lambda item: _write_text(*item), package_json_updates.items()))
 
     print("已写入完成。")
     return 0